@@ -0,0 +1,181 @@
+import os
+import time
+from typing import Iterable, Sequence
+import pygame
+
+Size = tuple[int, int]
+SpriteKey = tuple[str, Size | None]  # (normalized path, scaled size or None for the original)
+
+class AssetManager:
+    """
+    Loads every image once, converts it to the display pixel format and hands out shared surfaces.
+    Small sprites are packed into a single atlas and served as subsurfaces of it.
+
+    Without a display (headless) the surfaces are kept in their loaded format,
+    and `convert()` can be called once a display mode is set.
+
+    Surfaces returned by `get()` are shared and must not be modified (copy them first).
+    """
+    ATLAS_MAX_SIDE = 64  # sprites with both sides up to this go into the atlas
+    ATLAS_WIDTH = 256
+
+    def __init__(self, roots: Sequence[str] = ('assets', 'maps'), files: Sequence[str] = ('player_ship.png', 'enemy_ship.png')):
+        self.roots = roots
+        self.files = files
+        self.images: dict[str, pygame.Surface] = {}  # originals by path
+        self.sprites: dict[SpriteKey, pygame.Surface] = {}
+        self.atlas: pygame.Surface | None = None
+        self.atlas_rects: dict[SpriteKey, pygame.Rect] = {}
+        self.converted = False
+        self.load_time: float = 0  # s
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        return os.path.normpath(path)
+
+    @property
+    def headless(self):
+        return pygame.display.get_surface() is None
+
+    def paths(self) -> Iterable[str]:
+        for root in self.roots:
+            for directory, _, names in os.walk(root):
+                for name in sorted(names):
+                    if name.lower().endswith('.png'):
+                        yield self.normalize(os.path.join(directory, name))
+        for path in self.files:
+            yield self.normalize(path)
+
+    def preload(self, sprites: dict[str, Size] = None):
+        """Loads all images and scales & packs the given sprites (path -> size)."""
+        start = time.perf_counter()
+        for path in self.paths():
+            self.load(path)
+        for path, size in (sprites or {}).items():
+            self.get(path, size)
+        self.build_atlas()
+        self.converted = not self.headless
+        self.load_time = time.perf_counter() - start
+
+    def load(self, path: str) -> pygame.Surface:
+        path = self.normalize(path)
+        image = self.images.get(path)
+        if image is None:
+            image = self.images[path] = self.convert_surface(pygame.image.load(path))
+        return image
+
+    def convert_surface(self, surface: pygame.Surface) -> pygame.Surface:
+        """Converts to the display pixel format, keeping alpha only if it is actually used."""
+        if self.headless:
+            return surface
+        if surface.get_flags() & pygame.SRCALPHA and pygame.surfarray.pixels_alpha(surface).min() < 255:
+            return surface.convert_alpha()
+        return surface.convert()
+
+    def convert(self):
+        """Converts everything loaded so far, e.g. after the display mode was set."""
+        if self.headless or self.converted:
+            return
+        self.images = {path: self.convert_surface(image) for path, image in self.images.items()}
+        self.sprites = {key: self.convert_surface(sprite) for key, sprite in self.sprites.items()
+                        if key not in self.atlas_rects}
+        if self.atlas is not None:
+            self.atlas = self.atlas.convert_alpha()
+            for key, rect in self.atlas_rects.items():
+                self.sprites[key] = self.atlas.subsurface(rect)
+        self.converted = True
+
+    def get(self, path: str, size: Sequence[int] = None) -> pygame.Surface:
+        key = (self.normalize(path), None if size is None else (int(size[0]), int(size[1])))
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            image = self.load(path)
+            if key[1] is not None and key[1] != image.get_size():
+                image = self.convert_surface(pygame.transform.scale(image, key[1]))
+            sprite = self.sprites[key] = image
+        return sprite
+
+    def build_atlas(self):
+        """Packs the small scaled sprites into one surface using shelves, tallest first."""
+        keys = [key for key, sprite in self.sprites.items()
+                if key[1] is not None and key not in self.atlas_rects
+                and max(sprite.get_size()) <= AssetManager.ATLAS_MAX_SIDE]
+        if not keys:
+            return
+        keys += list(self.atlas_rects)
+        keys.sort(key=lambda key: self.sprites[key].get_height(), reverse=True)
+
+        rects: dict[SpriteKey, pygame.Rect] = {}
+        x = y = shelf_height = 0
+        for key in keys:
+            width, height = self.sprites[key].get_size()
+            if x + width > AssetManager.ATLAS_WIDTH:
+                x, y = 0, y + shelf_height
+                shelf_height = 0
+            rects[key] = pygame.Rect(x, y, width, height)
+            x += width
+            shelf_height = max(shelf_height, height)
+
+        atlas = pygame.Surface((AssetManager.ATLAS_WIDTH, y + shelf_height), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+        for key, rect in rects.items():
+            # max against a zeroed surface copies the pixels as they are, without blending
+            atlas.blit(self.sprites[key], rect, special_flags=pygame.BLEND_RGBA_MAX)
+        if not self.headless:
+            atlas = atlas.convert_alpha()
+
+        self.atlas = atlas
+        self.atlas_rects = rects
+        for key, rect in rects.items():
+            self.sprites[key] = atlas.subsurface(rect)
+
+    def blit_throughput(self, sprites: Iterable[pygame.Surface], target: pygame.Surface, duration: float = 0.5) -> float:
+        """Blits the sprites over the target for `duration` seconds, returns blits per second."""
+        sprites = list(sprites)
+        width, height = target.get_size()
+        positions = [((i * 37) % width, (i * 61) % height) for i in range(len(sprites))]
+        sequence = list(zip(sprites, positions))
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            target.blits(sequence, doreturn=False)
+            count += len(sequence)
+        return count / (time.perf_counter() - start)
+
+assets = AssetManager()
+
+if __name__ == '__main__':
+    from spaceship import SPRITES, Ammo, Heart, Projectile, Spaceship
+
+    pygame.init()
+    screen = pygame.display.set_mode((800, 600))
+
+    # The images a match asks for: 3 + 3 hearts, 2 ammo, 2 ships and 2 projectiles per shot (`shots` per ship)
+    shots = 100
+    instances = ([('assets/heart.png', Heart.SIZE)] * 3 + [('assets/black_heart.png', Heart.SIZE)] * 3
+                 + [('assets/charge.png', Ammo.SIZE)] * 2
+                 + [('player_ship.png', Spaceship.SIZE), ('enemy_ship.png', Spaceship.SIZE)]
+                 + [('assets/blue_laser_bullet.png', Projectile.SIZE)] * 2 * shots
+                 + [('assets/red_laser_bullet.png', Projectile.SIZE)] * 2 * shots)
+
+    # Before: every object loads & scales its own image, with no conversion
+    start = time.perf_counter()
+    before = [pygame.transform.scale(pygame.image.load(path), size) for path, size in instances]
+    before_time = time.perf_counter() - start
+    before_maps = [pygame.image.load(path) for path in ('maps/2.png', 'maps/3.png')]
+
+    # After: one preload (every image, the atlas and conversion), then shared surfaces for the same instances
+    assets.preload(SPRITES)
+    start = time.perf_counter()
+    after = [assets.get(path, size) for path, size in instances]
+    after_time = time.perf_counter() - start
+    after_maps = [assets.get(path) for path in ('maps/2.png', 'maps/3.png')]
+
+    print(f'display: {pygame.display.get_driver()}, atlas: {assets.atlas.get_size()}, {len(instances)} images')
+    print(f'load time before (load & scale each):  {before_time * 1000:8.2f} ms')
+    print(f'load time after (assets.get each):     {after_time * 1000:8.2f} ms, '
+          f'+ {assets.load_time * 1000:.2f} ms preloading once')
+    print(f'sprite blits/s before: {assets.blit_throughput(before, screen):12.0f}')
+    print(f'sprite blits/s after:  {assets.blit_throughput(after, screen):12.0f}')
+    print(f'map blits/s before:    {assets.blit_throughput(before_maps, screen):12.0f}')
+    print(f'map blits/s after:     {assets.blit_throughput(after_maps, screen):12.0f}')
@@ -0,0 +1,161 @@
+import threading
+import time
+from typing import Sequence
+import numpy as np
+import pygame
+import skfuzzy
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from fuzzy_ship_controller import FuzzyShipController
+from map import Coordinate
+
+class ChartBuffer:
+    """
+    One figure rendered with Agg, exposed to pygame through a surface sharing its pixel buffer.
+    The figure is opaque, so the alpha byte is ignored (RGBX) which makes blitting it much cheaper.
+    """
+
+    def __init__(self, panel: 'FuzzyChartsPanel'):
+        width, height = panel.size
+        self.figure = Figure(figsize=(width / panel.DPI, height / panel.DPI), dpi=panel.DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        gs = self.figure.add_gridspec(3, 1, height_ratios=(3, 2, 2), left=0.33, right=0.97, top=0.95, bottom=0.05, hspace=0.35)
+        labels = [f'{antecedent.label} {term}' for _, antecedent, term in panel.terms]
+
+        self.activation_axes = self.figure.add_subplot(gs[0])
+        self.activation_axes.set_xlim(0, 1)
+        self.activation_axes.set_yticks(range(len(labels)), labels, fontsize=6)
+        self.activation_axes.invert_yaxis()
+        self.activation_axes.tick_params(axis='x', labelsize=6)
+        self.activation_axes.set_title('membership', fontsize=7)
+        self.bars = self.activation_axes.barh(range(len(labels)), np.zeros(len(labels)), animated=True)
+
+        self.input_axes = self.figure.add_subplot(gs[1])
+        self.input_axes.set_xlim(0, panel.history - 1)
+        self.input_axes.set_ylim(-1.05, 1.05)
+        self.input_axes.tick_params(labelsize=6)
+        self.input_axes.set_title('inputs (normalized)', fontsize=7)
+        self.input_lines = [self.input_axes.plot([], [], lw=1, label=antecedent.label, animated=True)[0]
+                            for antecedent in panel.controller.inputs]
+        self.input_axes.legend(handles=self.input_lines, fontsize=5, loc='upper left', ncol=4)
+
+        self.output_axes = self.figure.add_subplot(gs[2])
+        self.output_axes.set_xlim(0, panel.history - 1)
+        self.output_axes.set_ylim(-1.05, 1.05)
+        self.output_axes.tick_params(labelsize=6)
+        self.output_axes.set_title('outputs', fontsize=7)
+        self.output_lines = [self.output_axes.plot([], [], lw=1, label=consequent.label, animated=True)[0]
+                             for consequent in panel.controller.outputs]
+        self.output_axes.legend(handles=self.output_lines, fontsize=5, loc='upper left', ncol=3)
+
+        # Full draw once; afterwards only the animated artists are redrawn over the saved backgrounds
+        self.canvas.draw()
+        self.backgrounds = {axes: self.canvas.copy_from_bbox(axes.bbox)
+                            for axes in (self.activation_axes, self.input_axes, self.output_axes)}
+        self.surface = pygame.image.frombuffer(self.canvas.buffer_rgba(), self.canvas.get_width_height(), 'RGBX')
+        self.activations = None
+        self.samples = -1
+
+    def redraw(self, axes, artists):
+        self.canvas.restore_region(self.backgrounds[axes])
+        for artist in artists:
+            axes.draw_artist(artist)
+        self.canvas.blit(axes.bbox)
+
+    def update(self, activations: np.ndarray, inputs: np.ndarray, outputs: np.ndarray, samples: int):
+        if self.activations is None or not np.array_equal(activations, self.activations):
+            for bar, activation in zip(self.bars, activations):
+                bar.set_width(activation)
+            self.redraw(self.activation_axes, self.bars)
+            self.activations = activations
+
+        if samples != self.samples:
+            x = np.arange(len(inputs))
+            for line, values in zip(self.input_lines, inputs.T):
+                line.set_data(x, values)
+            self.redraw(self.input_axes, self.input_lines)
+            for line, values in zip(self.output_lines, outputs.T):
+                line.set_data(x, values)
+            self.redraw(self.output_axes, self.output_lines)
+            self.samples = samples
+
+class FuzzyChartsPanel:
+    """
+    Side panel charting the fuzzy controller: membership activations, inputs and defuzzified outputs over time.
+    Charts are rendered by a background thread at `fps` into two alternating buffers,
+    the game loop only records samples and blits the last finished buffer.
+    """
+    DPI = 100
+
+    def __init__(self, controller: FuzzyShipController, size: Sequence[int], fps: float = 5, history: int = 300):
+        self.controller = controller
+        self.size = tuple(size)
+        self.fps = fps
+        self.history = history
+        self.terms = [(j, antecedent, term) for j, antecedent in enumerate(controller.inputs) for term in antecedent.terms]
+        self.scales = np.array([max(abs(antecedent.universe[0]), abs(antecedent.universe[-1]))
+                                for antecedent in controller.inputs], dtype=float)
+
+        self.inputs = np.zeros((history, len(controller.inputs)))
+        self.outputs = np.zeros((history, len(controller.outputs)))
+        self.samples = 0  # total recorded, the ring index is samples % history
+        self.data_lock = threading.Lock()
+
+        self.buffers = [ChartBuffer(self), ChartBuffer(self)]
+        self.front = 0
+        self.swap_lock = threading.Lock()
+
+        self.render_ms: float = 0  # worker time spent on the last update
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+    def record(self):
+        """Stores the controller's current inputs & outputs. Cheap, meant to be called every tick."""
+        inputs = self.controller.last_inputs
+        with self.data_lock:
+            i = self.samples % self.history
+            self.inputs[i] = [inputs.get(antecedent.label, 0) for antecedent in self.controller.inputs]
+            self.outputs[i] = (self.controller.gas, self.controller.brake, self.controller.steer)
+            self.samples += 1
+
+    def snapshot(self):
+        with self.data_lock:
+            samples = self.samples
+            i = samples % self.history
+            inputs = np.roll(self.inputs, -i, axis=0)
+            outputs = np.roll(self.outputs, -i, axis=0)
+        activations = np.array([skfuzzy.interp_membership(antecedent.universe, antecedent[term].mf, inputs[-1, j])
+                                for j, antecedent, term in self.terms])
+        return activations, inputs / self.scales, outputs, samples
+
+    def render(self):
+        start = time.perf_counter()
+        back = self.buffers[1 - self.front]
+        back.update(*self.snapshot())
+        with self.swap_lock:
+            self.front = 1 - self.front
+        self.render_ms = (time.perf_counter() - start) * 1000
+
+    def run(self):
+        period = 1 / self.fps
+        while self.running:
+            start = time.perf_counter()
+            self.render()
+            time.sleep(max(0, period - (time.perf_counter() - start)))
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name='charts', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def draw(self, screen: pygame.Surface, position: Coordinate):
+        with self.swap_lock:
+            screen.blit(self.buffers[self.front].surface, position)
@@ -12,7 +12,7 @@ class FuzzyShipController(ShipController):
     def __init__(self, ship: Spaceship):
         super().__init__(ship)
 
-        self.fig = None
+        self.last_inputs: dict[str, float] = {}
 
         self.setup_inputs()
         self.setup_outputs()
@@ -121,16 +121,20 @@ class FuzzyShipController(ShipController):
 
     def update_simulation(self, wall_sensors: dict[str, RayCastResult], enemy_sensors: dict[str, RayCastResult]):
         
-        # Wall Sensors
-        self.simulation.input['velocity'] = self.ship.velocity
-        self.simulation.input['w_balance'] = wall_sensors['left'].distance - wall_sensors['right'].distance
-        self.simulation.input['w_side'] = wall_sensors['hard_left'].distance - wall_sensors['hard_right'].distance
-        self.simulation.input['w_head'] = wall_sensors['head'].distance
-
-        # Enemy Sensors
-        self.simulation.input['e_balance'] = enemy_sensors['left'].distance - enemy_sensors['right'].distance
-        self.simulation.input['e_side'] = enemy_sensors['hard_left'].distance - enemy_sensors['hard_right'].distance
-        self.simulation.input['e_head'] = enemy_sensors['head'].distance
+        self.last_inputs = {
+            # Wall Sensors
+            'velocity': self.ship.velocity,
+            'w_balance': wall_sensors['left'].distance - wall_sensors['right'].distance,
+            'w_side': wall_sensors['hard_left'].distance - wall_sensors['hard_right'].distance,
+            'w_head': wall_sensors['head'].distance,
+
+            # Enemy Sensors
+            'e_balance': enemy_sensors['left'].distance - enemy_sensors['right'].distance,
+            'e_side': enemy_sensors['hard_left'].distance - enemy_sensors['hard_right'].distance,
+            'e_head': enemy_sensors['head'].distance,
+        }
+        for label, value in self.last_inputs.items():
+            self.simulation.input[label] = value
         
         self.simulation.compute()
         self.gas = max(0, self.simulation.output['gas'])
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import time
+from typing import Callable, Sequence
+import pygame
+
+from map import Coordinate
+from spaceship import Ammo, Heart, Spaceship
+
+FontFactory = Callable[[int], pygame.font.Font]
+TextKey = tuple[str, tuple[int, int, int, int], int]  # (string, color, size)
+
+class Hud:
+    """
+    Composes hearts, ammo indicators and messages into a single cached surface.
+    The surface is only rebuilt when the state it shows changes (health, ammo ready or message),
+    and rendered text lines are cached by (string, color, size).
+    """
+    TEXT_CACHE_SIZE = 128
+
+    def __init__(self, size: Sequence[int], font_factory: FontFactory):
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.font_factory = font_factory
+        self.fonts: dict[int, pygame.font.Font] = {}
+        self.text_cache: OrderedDict[TextKey, pygame.Surface] = OrderedDict()
+
+        self.hearts: list[tuple[Spaceship, list[Heart]]] = []
+        self.ammo: list[tuple[Spaceship, Ammo]] = []
+        self.message: tuple | None = None
+
+        self.state = None
+        self.dirty_rects: list[pygame.Rect] = []  # areas of the surface actually drawn on
+        self.rebuilds = 0
+        self.cost_ms: float = 0  # time spent on the HUD in the last frame
+
+    def add_hearts(self, ship: Spaceship, hearts: list[Heart]):
+        self.hearts.append((ship, hearts))
+        self.state = None
+
+    def add_ammo(self, ship: Spaceship, ammo: Ammo):
+        self.ammo.append((ship, ammo))
+        self.state = None
+
+    def set_message(self, text: str | None, position: Coordinate = (0, 0), size: int = 16,
+                    color: pygame.Color = (0, 0, 0)):
+        self.message = None if text is None else (text, tuple(position), size, tuple(pygame.Color(color)))
+
+    def font(self, size: int) -> pygame.font.Font:
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = self.font_factory(size)
+            font.set_bold(True)
+        return font
+
+    def render_text(self, line: str, color: pygame.Color, size: int) -> pygame.Surface:
+        color = tuple(pygame.Color(color))
+        key = (line, color, size)
+        text_surface = self.text_cache.get(key)
+        if text_surface is None:
+            text_surface = self.font(size).render(line, True, color)
+            self.text_cache[key] = text_surface
+            if len(self.text_cache) > Hud.TEXT_CACHE_SIZE:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(key)
+        return text_surface
+
+    def draw_text(self, surface: pygame.Surface, text: str, position: Coordinate, size: int = 16,
+                  color: pygame.Color = (0, 0, 0)) -> list[pygame.Rect]:
+        position = list(position)
+        rects = []
+        for line in text.splitlines():
+            rects.append(surface.blit(self.render_text(line, color, size), position))
+            position[1] += self.font(size).get_height()
+        return rects
+
+    def current_state(self):
+        return (tuple(ship.health for ship, _ in self.hearts),
+                tuple(ship.shoot_timer == 0 for ship, _ in self.ammo),
+                self.message)
+
+    def rebuild(self):
+        for rect in self.dirty_rects:
+            self.surface.fill((0, 0, 0, 0), rect)
+        rects = []
+        for ship, hearts in self.hearts:
+            for heart in hearts[:ship.health]:
+                rects.append(heart.draw(self.surface))
+        for ship, ammo in self.ammo:
+            if ship.shoot_timer == 0:
+                rects.append(ammo.draw(self.surface))
+        if self.message is not None:
+            text, position, size, color = self.message
+            rects += self.draw_text(self.surface, text, position, size, color)
+        self.dirty_rects = rects
+        self.rebuilds += 1
+
+    def draw(self, screen: pygame.Surface):
+        start = time.perf_counter()
+        state = self.current_state()
+        if state != self.state:
+            self.rebuild()
+            self.state = state
+        screen.blits([(self.surface, rect, rect) for rect in self.dirty_rects], doreturn=False)
+        self.cost_ms = (time.perf_counter() - start) * 1000
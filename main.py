@@ -1,23 +1,28 @@
 import os
-from time import sleep
 import pygame
 import sys
-import math
 import numpy as np
 import skfuzzy
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.backends.backend_agg as agg
 from fuzzy_ship_controller import FuzzyShipController
+from charts import FuzzyChartsPanel
+from telemetry import TelemetryRing, TelemetryWriter, open_sink
 
-from map import Map
-from spaceship import Ammo, Spaceship, ShipController, Heart
+from asset_manager import assets
+from spaceship import SPRITES, Ammo, ShipController, Heart
 from keyboard_ship_controller import KeyboardShipController
+from simulation import ENEMY, PLAYER, Match, load_map
+from hud import Hud
 
 def get_env_boolean(key: str, default: bool) -> bool:
     return os.getenv(key, 'y' if default else 'n').lower()[0] in ('t', '1', 'y')
 
 USE_PYGAME_MATPLOTLIB_BACKEND = get_env_boolean('USE_PYGAME_MATPLOTLIB_BACKEND', False)
+SHOW_CHARTS = get_env_boolean('SHOW_CHARTS', False)
+SIM_SPEED = float(os.getenv('SIM_SPEED', '1'))  # fast-forward factor, scales dt (collisions are swept, so coarse steps are fine)
+TELEMETRY = os.getenv('TELEMETRY')  # e.g. csv:telemetry.csv, columns:telemetry/ or socket:127.0.0.1:9000
 
 if USE_PYGAME_MATPLOTLIB_BACKEND:
     matplotlib.use('module://pygame_matplotlib.backend_pygame')
@@ -30,53 +35,32 @@ pygame.font.init()
 FPS = 60
 MAX_WIDTH = 900
 MAX_HEIGHT = 900
-CHARTS_AREA_WIDTH = 0
+CHARTS_AREA_WIDTH = 320 if SHOW_CHARTS else 0
 
-map = Map('maps/2.png', MAX_WIDTH - CHARTS_AREA_WIDTH, MAX_HEIGHT) 
-map.default_wall_condition = lambda x_y, map : map.surface.get_at((int(x_y[0]), int(x_y[1])))[1] > 100 # green
+# Loaded before the display exists (headless), converted to its pixel format right after it is set
+assets.preload(SPRITES)
+
+map = load_map('maps/2.png', MAX_WIDTH - CHARTS_AREA_WIDTH, MAX_HEIGHT)
 
 screen = pygame.display.set_mode((map.width + CHARTS_AREA_WIDTH, map.height))
 pygame.display.set_caption("Fuzzy Space Shooter!")
 
-try:
-    my_font = pygame.font.SysFont('consolas', 16)
-except:
-    my_font = pygame.font.SysFont('dejavusansmono', 16)
-    pass
-
-def draw_text(
-        text: str, 
-        position, 
-        size: int,
-        font: pygame.font.Font = my_font, 
-        surface: pygame.Surface = screen, 
-        color: pygame.Color = (0, 0, 0)):
-    position = list(position)
-    for line in text.splitlines():
-        text_surface = my_font.render(line, True, color)
-        surface.blit(text_surface, position)
-        position[1] += font.get_height()
-        # font.set_point_size(size)
-        font.set_bold(True)
-
-def restart_game():
-      enemySpaceship.position[0] =  map.starting_position[0] + 90
-      enemySpaceship.position[1] =  map.starting_position[1] + 0
-      enemySpaceship.angle = map.starting_angle
-      enemySpaceship.health = 3
-      
-      playerSpaceship.position[0] =  map.starting_position[0] - 60
-      playerSpaceship.position[1] =  map.starting_position[1] + 0
-      playerSpaceship.angle = map.starting_angle
-      playerSpaceship.health = 3
+assets.convert()
+map.surface = assets.convert_surface(map.surface)
+
+def load_font(size: int) -> pygame.font.Font:
+    try:
+        return pygame.font.SysFont('consolas', size)
+    except:
+        return pygame.font.SysFont('dejavusansmono', size)
 
 clock = pygame.time.Clock()
 
-enemySpaceship = Spaceship("enemy_ship.png", tuple(a + b for a, b in zip(map.starting_position, (90,0))), map.starting_angle)
-playerSpaceship = Spaceship("player_ship.png", tuple(a + b for a, b in zip(map.starting_position, (-60,0))), map.starting_angle, enemySpaceship.position)
+match = Match(map, (KeyboardShipController, FuzzyShipController), error_backoff=0.100)
+playerSpaceship, enemySpaceship = match.ships
 
 # Health & Ammo
-initPlayerHealthPosX = pygame.display.get_surface().get_size()[0] - (30 * 3)
+initPlayerHealthPosX = map.width - (30 * 3)
 playerHealthArray = [Heart("assets/heart.png", (initPlayerHealthPosX, 30)),
                     Heart("assets/heart.png", (initPlayerHealthPosX + 30, 30)),
                     Heart("assets/heart.png", (initPlayerHealthPosX + 60, 30))]
@@ -88,29 +72,35 @@ enemyHealthArray = [Heart("assets/black_heart.png", (30, initEnemyHealthPosY)),
                     Heart("assets/black_heart.png", (30 + 60, initEnemyHealthPosY))]
 enemyAmmo = Ammo("assets/charge.png", (30 + 90, initEnemyHealthPosY - 1.5))
 
-enemySpaceship.default_wall_condition = lambda x_y, spaceship: spaceship.is_near_enemy(x_y, playerSpaceship.position)
-playerSpaceship.default_wall_condition = lambda x_y, spaceship: spaceship.is_near_enemy(x_y, enemySpaceship.position)
-
-sensors_angles = {
-    'head': math.radians(0),
-    'left': math.radians(30),
-    'right': math.radians(-30),
-    'hard_left': math.radians(90),
-    'hard_right': math.radians(-90),
-}
+hud = Hud(screen.get_size(), load_font)
+hud.add_hearts(playerSpaceship, playerHealthArray)
+hud.add_hearts(enemySpaceship, enemyHealthArray)
+hud.add_ammo(playerSpaceship, playerAmmo)
+hud.add_ammo(enemySpaceship, enemyAmmo)
 
-keyboard_ship_controller = KeyboardShipController(playerSpaceship)
-fuzzy_ship_controller = FuzzyShipController(enemySpaceship)
+keyboard_ship_controller, fuzzy_ship_controller = match.controllers
 
 player_controller: ShipController = keyboard_ship_controller
 enemy_controller: ShipController = fuzzy_ship_controller
 
+charts = None
+if SHOW_CHARTS:
+    charts = FuzzyChartsPanel(fuzzy_ship_controller, (CHARTS_AREA_WIDTH, map.height))
+    charts.start()
+
+telemetry = None
+telemetry_writer = None
+if TELEMETRY:
+    telemetry = TelemetryRing()
+    telemetry_writer = TelemetryWriter(telemetry, open_sink(TELEMETRY))
+    telemetry_writer.start()
+
 all_sprites = pygame.sprite.Group()
 all_sprites.add(playerSpaceship)
 all_sprites.add(enemySpaceship)
 
 # Background
-background = pygame.image.load('maps/3.png')
+background = assets.get('maps/3.png', map.surface.get_size())
 background_rect = background.get_rect(center=(map.width // 2, map.height // 2))
 # <--
 
@@ -121,7 +111,7 @@ playerWon = False
 debug = False
 
 while running:
-    dt = clock.tick(FPS) / 1000 # s
+    dt = clock.tick(FPS) / 1000 * SIM_SPEED # s
 
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
@@ -138,45 +128,22 @@ while running:
                 running = True
                 end = False
                 playerWon = False
-                restart_game(); 
+                match.restart()
             if ((event.key == pygame.K_d)): 
                 debug = not debug
 
-    wall_ray_casts = {k: map.cast_ray_to_wall(enemySpaceship.position, enemySpaceship.angle + v) 
-                      for k, v in sensors_angles.items()}
-    
-    ship_ray_casts = {k: enemySpaceship.cast_ray_to_ship(enemySpaceship.position, enemySpaceship.angle + v) 
-                    for k, v in sensors_angles.items()}
-    
     if not paused:
-        try:
-            fuzzy_ship_controller.update_simulation(wall_sensors=wall_ray_casts, enemy_sensors=ship_ray_casts)
-        except ValueError as error:
-            print('Error updating simulation:', error)
-            try:
-                fuzzy_ship_controller.simulation.print_state()
-            except ValueError as error:
-                print('Further error printing out state:', error)
-                print('inputs: ' + ' '.join([f'{v.label}={v.input["current"]}, ' for v in fuzzy_ship_controller.inputs]))
-            sleep(0.100)
-
-        playerSpaceship.check_collision(enemySpaceship.projectiles)
-        enemySpaceship.check_collision(playerSpaceship.projectiles)
-        
-        playerSpaceship.check_screen_boundaries()
-        enemySpaceship.check_screen_boundaries()
-        
-        if (playerSpaceship.health == 0):
-            end = True
-            playerWon = False
-        if (enemySpaceship.health == 0):
+        match.step(dt)
+        if charts is not None:
+            charts.record()
+
+        if match.winner is not None:
             end = True
-            playerWon = True 
+            playerWon = match.winner == PLAYER
 
-        player_controller.update(dt=dt)
-        enemy_controller.update(dt=dt)
-        
-        all_sprites.update(dt=dt)
+        if telemetry is not None:
+            telemetry.record(match.tick, match.time, PLAYER, playerSpaceship, player_controller, *match.sensors.get(PLAYER, ()))
+            telemetry.record(match.tick, match.time, ENEMY, enemySpaceship, enemy_controller, *match.sensors.get(ENEMY, ()))
         
     screen.blit(map.surface, (0, 0))
     # Cover
@@ -207,27 +174,8 @@ while running:
     playerSpaceship.projectiles.draw(screen)
     enemySpaceship.projectiles.draw(screen)
 
-    # Health
-    for i in range(playerSpaceship.health):
-        playerHealthArray[i].draw(screen)
-
-    # Health
-    for i in range(enemySpaceship.health):
-        enemyHealthArray[i].draw(screen)
-        
-    # # Blink effect
-    # if (enemySpaceship.health_timer > 0):
-    #     if (enemySpaceship.blink_counter % 2 == 0): 
-    #         enemySpaceship.draw(screen)
-    # else: 
-    #     enemySpaceship.draw(screen)
-    
-    # Ammo
-    if (playerSpaceship.shoot_timer == 0): playerAmmo.draw(screen)
-    if (enemySpaceship.shoot_timer == 0): enemyAmmo.draw(screen)
-
-
-    if (debug==True):
+    if (debug==True and ENEMY in match.sensors):
+        wall_ray_casts, ship_ray_casts = match.sensors[ENEMY]
         for k, v in wall_ray_casts.items():
             v.draw(screen, pygame.Color(99, 20, 20), width=2)
             
@@ -236,12 +184,29 @@ while running:
 
     if (end==True and playerWon==False): 
         paused = True
-        draw_text(f'Game Over! =(\nSPACE to try again!', position=(MAX_WIDTH / 5,MAX_HEIGHT / 6.25), color=(255, 0, 0), size=32)
-    if (end==True and playerWon==True): 
+        hud.set_message(f'Game Over! =(\nSPACE to try again!', position=(MAX_WIDTH / 5,MAX_HEIGHT / 6.25), color=(255, 0, 0), size=16)
+    elif (end==True and playerWon==True): 
         paused = True
-        draw_text(f'You Win! =)\nSPACE to try again!', position=(MAX_WIDTH / 4,MAX_HEIGHT / 6.25), color=(0, 255, 0), size=32)
+        hud.set_message(f'You Win! =)\nSPACE to try again!', position=(MAX_WIDTH / 4,MAX_HEIGHT / 6.25), color=(0, 255, 0), size=16)
+    else:
+        hud.set_message(None)
+
+    # Health, Ammo & messages
+    hud.draw(screen)
+
+    if charts is not None:
+        charts.draw(screen, (map.width, 0))
+
+    if (debug==True):
+        hud.draw_text(screen, f'HUD: {hud.cost_ms:.2f} ms\nHUD rebuilds: {hud.rebuilds}', position=(10, 10))
+        if charts is not None:
+            hud.draw_text(screen, f'Charts: {charts.render_ms:.2f} ms', position=(10, 42))
 
     pygame.display.flip()
 
+if charts is not None:
+    charts.stop()
+if telemetry_writer is not None:
+    telemetry_writer.stop()
 pygame.quit()
 sys.exit()
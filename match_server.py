@@ -0,0 +1,563 @@
+import argparse
+import math
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Iterable
+import pygame
+
+from asset_manager import assets
+from spaceship import Projectile, Spaceship, ShipController
+from simulation import Match, load_map
+
+# Messages are length prefixed (u32), the first byte is the type
+HELLO = 0     # client -> server: role, ship
+SNAPSHOT = 1  # server -> client
+INPUT = 2     # client -> server: gas, brake, steer, fire, client time, last tick seen
+
+SPECTATOR = 0
+BOT = 1
+
+KEYFRAME = 0xFFFFFFFF  # baseline tick of a snapshot sent in full
+
+LENGTH = struct.Struct('<I')
+HELLO_FORMAT = struct.Struct('<BBB')
+SNAPSHOT_HEADER = struct.Struct('<BIId')
+INPUT_FORMAT = struct.Struct('<BfffBdI')
+
+# Quantization; ids below SHIP_COUNT are ships, the rest projectiles
+SHIP_COUNT = 2
+SHIP_FIELDS = 7
+PROJECTILE_FIELDS = 4
+POSITION_SCALE = 8  # 1/8 px
+ANGLE_SCALE = 65536 / (2 * math.pi)
+VELOCITY_SCALE = 16
+TIMER_SCALE = 10  # 100 ms, enough for cooldown indicators
+
+MAX_OUTBOX = 1 << 16  # skip snapshots for clients with this many bytes still unsent
+
+def quantize_angle(angle: float) -> int:
+    return round((angle % (2 * math.pi)) * ANGLE_SCALE) % 65536
+
+def quantize_ship(ship: Spaceship) -> tuple[int, ...]:
+    return (round(ship.position[0] * POSITION_SCALE), round(ship.position[1] * POSITION_SCALE),
+            quantize_angle(ship.angle), round(ship.velocity * VELOCITY_SCALE), ship.health,
+            round(ship.shoot_timer * TIMER_SCALE), round(ship.health_timer * TIMER_SCALE))
+
+def quantize_projectile(projectile: Projectile, owner: int) -> tuple[int, ...]:
+    return (round(projectile.position[0] * POSITION_SCALE), round(projectile.position[1] * POSITION_SCALE),
+            quantize_angle(projectile.angle), owner)
+
+def dequantize_ship(values: tuple[int, ...]) -> dict:
+    x, y, angle, velocity, health, shoot_timer, health_timer = values
+    return {'position': (x / POSITION_SCALE, y / POSITION_SCALE), 'angle': angle / ANGLE_SCALE,
+            'velocity': velocity / VELOCITY_SCALE, 'health': health,
+            'shoot_timer': shoot_timer / TIMER_SCALE, 'health_timer': health_timer / TIMER_SCALE}
+
+def dequantize_projectile(values: tuple[int, ...]) -> dict:
+    x, y, angle, owner = values
+    return {'position': (x / POSITION_SCALE, y / POSITION_SCALE), 'angle': angle / ANGLE_SCALE, 'owner': owner}
+
+# Varints (LEB128) of zigzag encoded deltas, so small changes take a single byte
+def write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data: bytes, i: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, i
+        shift += 7
+
+def zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+State = dict[int, tuple[int, ...]]
+
+def encode_snapshot(tick: int, state: State, baseline_tick: int = KEYFRAME, baseline: State = None,
+                    send_time: float = 0) -> bytes:
+    """
+    Only entities that changed since the baseline are sent, as a bitmask of the changed fields followed by
+    their deltas; entities gone since the baseline are listed by id. Without a baseline it's a full keyframe.
+    """
+    baseline = baseline or {}
+    out = bytearray(SNAPSHOT_HEADER.pack(SNAPSHOT, tick, baseline_tick, send_time))
+    changed = bytearray()
+    count = 0
+    for entity, values in state.items():
+        previous = baseline.get(entity) or (0,) * len(values)
+        mask = 0
+        for f, (value, old) in enumerate(zip(values, previous)):
+            if value != old:
+                mask |= 1 << f
+        if mask == 0 and entity in baseline:
+            continue
+        write_varint(changed, entity)
+        write_varint(changed, mask)
+        for f, (value, old) in enumerate(zip(values, previous)):
+            if mask & (1 << f):
+                write_varint(changed, zigzag(value - old))
+        count += 1
+    write_varint(out, count)
+    out += changed
+    removed = [entity for entity in baseline if entity not in state]
+    write_varint(out, len(removed))
+    for entity in removed:
+        write_varint(out, entity)
+    return LENGTH.pack(len(out)) + out
+
+def decode_snapshot(data: bytes, state: State) -> tuple[int, int, float, State]:
+    """Applies a snapshot (without its length prefix) on top of `state`, which must be its baseline."""
+    _, tick, baseline_tick, send_time = SNAPSHOT_HEADER.unpack_from(data)
+    state = {} if baseline_tick == KEYFRAME else dict(state)
+    i = SNAPSHOT_HEADER.size
+    count, i = read_varint(data, i)
+    for _ in range(count):
+        entity, i = read_varint(data, i)
+        mask, i = read_varint(data, i)
+        values = list(state.get(entity) or (0,) * (SHIP_FIELDS if entity < SHIP_COUNT else PROJECTILE_FIELDS))
+        for f in range(len(values)):
+            if mask & (1 << f):
+                delta, i = read_varint(data, i)
+                values[f] += unzigzag(delta)
+        state[entity] = tuple(values)
+    count, i = read_varint(data, i)
+    for _ in range(count):
+        entity, i = read_varint(data, i)
+        del state[entity]
+    return tick, baseline_tick, send_time, state
+
+class MessageReader:
+    """Splits a byte stream into length prefixed messages, raises ValueError for empty or too long ones."""
+
+    def __init__(self, max_length: int = None):
+        self.buffer = bytearray()
+        self.max_length = max_length
+
+    def feed(self, data: bytes) -> Iterable[bytes]:
+        self.buffer += data
+        while len(self.buffer) >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(self.buffer)
+            if length == 0 or (self.max_length is not None and length > self.max_length):
+                raise ValueError(f'Invalid message length {length}')
+            if len(self.buffer) < LENGTH.size + length:
+                break
+            message = bytes(self.buffer[LENGTH.size:LENGTH.size + length])
+            del self.buffer[:LENGTH.size + length]
+            yield message
+
+def pack_message(format: struct.Struct, *values) -> bytes:
+    return LENGTH.pack(format.size) + format.pack(*values)
+
+class RemoteShipController(ShipController):
+    """Driven by the last input received from a bot client."""
+
+    def __init__(self, ship: Spaceship, projectile_type: int):
+        super().__init__(ship)
+        self.projectile_type = projectile_type
+        self.fire = False
+
+    def update(self, dt: float, *args, **kwargs):
+        if self.fire:
+            self.ship.fire_projectiles(self.projectile_type)
+        super().update(dt, *args, **kwargs)
+
+class ClientConnection:
+    def __init__(self, sock: socket.socket, address):
+        self.socket = sock
+        self.address = address
+        self.reader = MessageReader(max_length=max(HELLO_FORMAT.size, INPUT_FORMAT.size))
+        self.outbox = bytearray()
+        self.role: int | None = None
+        self.ship: int | None = None
+        self.controller: RemoteShipController | None = None  # bots only
+        self.displaced: ShipController | None = None  # the controller `controller` replaced, put back on disconnect
+        self.baseline_tick = KEYFRAME
+        self.baseline: State | None = None
+        self.snapshots = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.full_bytes = 0  # what sending every snapshot in full would have cost
+        self.input_latencies: list[float] = []
+        self.failed = False  # sending failed, disconnected by the server once it is done iterating its clients
+
+    def flush(self):
+        if self.outbox and not self.failed:
+            try:
+                sent = self.socket.send(self.outbox)
+            except BlockingIOError:
+                return
+            except OSError:
+                self.failed = True
+                return
+            del self.outbox[:sent]
+
+class MatchServer:
+    """
+    Authoritative match: steps the simulation at a fixed tick rate and sends each client quantized,
+    delta-compressed snapshots at `snapshot_rate`. Bot clients take over a ship's controls while connected,
+    otherwise it's flown by a FuzzyShipController.
+
+    Each fuzzy-flown ship costs ~15 ms per tick (the skfuzzy simulation), far more than everything else. One is
+    just within a 60 Hz tick, but with both ships fuzzy-flown the realtime loop can't keep up: it steps back to back
+    and the match runs slower than real time (~35 ticks/s measured), with snapshots dropping by the same factor.
+    `bench()` reports the rate actually reached.
+
+    TCP delivers in order, so the last snapshot queued for a client is always a valid baseline for the next one.
+    """
+
+    def __init__(self, address=('127.0.0.1', 0), tick_rate: float = 60, snapshot_rate: float = 20,
+                 realtime: bool = True):
+        map = load_map()
+        if pygame.display.get_surface() is None:
+            pygame.display.set_mode((map.width, map.height))
+        self.match = Match(map)
+        self.scores = [0, 0]
+        self.tick_rate = tick_rate
+        self.snapshot_every = max(1, round(tick_rate / snapshot_rate))
+        self.realtime = realtime
+        self.listener = socket.create_server(address)
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.clients: dict[socket.socket, ClientConnection] = {}
+        self.finished: list[ClientConnection] = []
+        self.projectile_ids: dict[Projectile, int] = {}
+        self.next_projectile_id = SHIP_COUNT
+        self.step_time: float = 0  # s spent simulating
+
+    def state(self) -> State:
+        state = {i: quantize_ship(ship) for i, ship in enumerate(self.match.ships)}
+        ids = {}
+        for owner, ship in enumerate(self.match.ships):
+            for projectile in ship.projectiles:
+                entity = self.projectile_ids.get(projectile)
+                if entity is None:
+                    entity = self.next_projectile_id
+                    self.next_projectile_id += 1
+                ids[projectile] = entity
+                state[entity] = quantize_projectile(projectile, owner)
+        self.projectile_ids = ids
+        return state
+
+    def broadcast(self):
+        state = self.state()
+        now = time.time()
+        full_size = len(encode_snapshot(self.match.tick, state, send_time=now))
+        for client in self.clients.values():
+            if client.role is None:
+                continue
+            client.full_bytes += full_size
+            if len(client.outbox) > MAX_OUTBOX:
+                client.skipped += 1
+                continue
+            message = encode_snapshot(self.match.tick, state, client.baseline_tick, client.baseline, now)
+            client.outbox += message
+            client.bytes_sent += len(message)
+            client.snapshots += 1
+            client.baseline_tick, client.baseline = self.match.tick, state
+            client.flush()
+        self.disconnect_failed()
+
+    def accept(self):
+        sock, address = self.listener.accept()
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients[sock] = ClientConnection(sock, address)
+        self.selector.register(sock, selectors.EVENT_READ)
+
+    def disconnect(self, client: ClientConnection, restore: bool = True):
+        self.selector.unregister(client.socket)
+        client.socket.close()
+        del self.clients[client.socket]
+        if restore and client.controller is not None and self.match.controllers[client.ship] is client.controller:
+            self.match.controllers[client.ship] = client.displaced
+        self.finished.append(client)
+
+    def disconnect_failed(self):
+        for client in [client for client in self.clients.values() if client.failed]:
+            self.disconnect(client)
+
+    def handle(self, client: ClientConnection, message: bytes):
+        """Applies one client message, raises ValueError for anything malformed or not allowed."""
+        if message[0] == HELLO:
+            if len(message) != HELLO_FORMAT.size:
+                raise ValueError(f'HELLO of {len(message)} bytes')
+            if client.role is not None:
+                raise ValueError('Repeated HELLO')
+            _, role, ship = HELLO_FORMAT.unpack(message)
+            if role not in (SPECTATOR, BOT):
+                raise ValueError(f'Unknown role {role}')
+            if role == BOT:
+                if ship >= SHIP_COUNT:
+                    raise ValueError(f'Unknown ship {ship}')
+                if any(other.controller is not None and other.ship == ship for other in self.clients.values()):
+                    raise ValueError(f'Ship {ship} is already flown by another bot')
+                client.controller = RemoteShipController(self.match.ships[ship], ship)
+                client.displaced = self.match.controllers[ship]
+                self.match.controllers[ship] = client.controller
+            client.role, client.ship = role, ship
+        elif message[0] == INPUT:
+            if len(message) != INPUT_FORMAT.size:
+                raise ValueError(f'INPUT of {len(message)} bytes')
+            if client.controller is None:
+                raise ValueError('INPUT from a client that is not a bot')
+            _, gas, brake, steer, fire, client_time, _ = INPUT_FORMAT.unpack(message)
+            if not all(math.isfinite(value) for value in (gas, brake, steer, client_time)):
+                raise ValueError('INPUT with non finite values')
+            controller = client.controller
+            controller.gas, controller.brake, controller.steer, controller.fire = gas, brake, steer, bool(fire)
+            client.input_latencies.append(time.time() - client_time)
+        else:
+            raise ValueError(f'Unknown message type {message[0]}')
+
+    def receive(self, client: ClientConnection):
+        try:
+            data = client.socket.recv(65536)
+        except ConnectionError:
+            data = b''
+        if not data:
+            self.disconnect(client)
+            return
+        try:
+            for message in client.reader.feed(data):
+                self.handle(client, message)
+        except ValueError as error:
+            print(f'Disconnecting {client.address[0]}:{client.address[1]}: {error}', flush=True)
+            self.disconnect(client)
+
+    def poll(self, timeout: float):
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj is self.listener:
+                self.accept()
+            else:
+                self.receive(self.clients[key.fileobj])
+        for client in self.clients.values():
+            client.flush()
+        self.disconnect_failed()
+
+    def run(self, duration: float = None):
+        dt = 1 / self.tick_rate
+        start = next_tick = time.perf_counter()
+        while duration is None or time.perf_counter() - start < duration:
+            self.poll(max(0, next_tick - time.perf_counter()) if self.realtime else 0)
+            if self.realtime and time.perf_counter() < next_tick:
+                continue
+            step_start = time.perf_counter()
+            self.match.step(dt)
+            if self.match.winner is not None:
+                self.scores[self.match.winner] += 1
+                self.match.restart()
+            self.step_time += time.perf_counter() - step_start
+            if self.match.tick % self.snapshot_every == 0:
+                self.broadcast()
+            next_tick += dt
+
+    def close(self):
+        for client in list(self.clients.values()):
+            self.disconnect(client, restore=False)  # the match is over, no one flies the ships anymore
+        self.selector.close()
+        self.listener.close()
+
+    def stats(self) -> list[dict]:
+        return [{'address': client.address, 'role': client.role, 'ship': client.ship, 'snapshots': client.snapshots,
+                 'skipped': client.skipped, 'bytes_sent': client.bytes_sent, 'full_bytes': client.full_bytes,
+                 'input_latencies': client.input_latencies}
+                for client in self.finished + list(self.clients.values())]
+
+class MatchClient:
+    """Receives snapshots into `state` / `tick`; spectators only receive, bots also send inputs."""
+
+    def __init__(self, address, role: int = SPECTATOR, ship: int = 0):
+        self.socket = socket.create_connection(address)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.role = role
+        self.ship = ship
+        self.reader = MessageReader()
+        self.state: State = {}
+        self.tick = KEYFRAME
+        self.snapshots = 0
+        self.bytes_received = 0
+        self.latencies: list[float] = []
+        self.socket.sendall(pack_message(HELLO_FORMAT, HELLO, role, ship))
+
+    def receive(self) -> bool:
+        """Blocks for data and applies the snapshots in it; False once the server closed the connection."""
+        try:
+            data = self.socket.recv(65536)
+        except ConnectionError:
+            data = b''
+        if not data:
+            return False
+        now = time.time()
+        self.bytes_received += len(data)
+        for message in self.reader.feed(data):
+            if message[0] != SNAPSHOT:
+                continue
+            tick, baseline_tick, send_time, self.state = decode_snapshot(message, self.state)
+            if baseline_tick not in (KEYFRAME, self.tick):
+                raise ValueError(f'Snapshot {tick} is based on {baseline_tick}, but we are at {self.tick}')
+            self.tick = tick
+            self.snapshots += 1
+            self.latencies.append(now - send_time)
+        return True
+
+    def run(self):
+        while self.receive():
+            pass
+
+    def send_input(self, gas: float, brake: float, steer: float, fire: bool):
+        self.socket.sendall(pack_message(INPUT_FORMAT, INPUT, gas, brake, steer, fire, time.time(), self.tick % KEYFRAME))
+
+    def ships(self) -> list[dict]:
+        return [dequantize_ship(self.state[i]) for i in range(SHIP_COUNT) if i in self.state]
+
+    def projectiles(self) -> list[dict]:
+        return [dequantize_projectile(values) for entity, values in self.state.items() if entity >= SHIP_COUNT]
+
+    def close(self):
+        self.socket.close()
+
+class BotClient(MatchClient):
+    """Turns toward the enemy and fires when roughly facing it."""
+
+    def __init__(self, address, ship: int):
+        super().__init__(address, BOT, ship)
+
+    def think(self):
+        ships = self.ships()
+        if len(ships) < SHIP_COUNT:
+            return
+        me, enemy = ships[self.ship], ships[1 - self.ship]
+        dx = enemy['position'][0] - me['position'][0]
+        dy = enemy['position'][1] - me['position'][1]
+        error = (math.atan2(dx, dy) - me['angle'] + math.pi) % (2 * math.pi) - math.pi
+        self.send_input(gas=0.5, brake=0, steer=max(-1, min(1, error * 2)), fire=abs(error) < 0.2)
+
+    def run(self):
+        while self.receive():
+            self.think()
+
+def run_renderer(address):
+    """Spectator window drawing the snapshots, nothing is simulated here."""
+    pygame.init()
+    map = load_map()  # same map & scaling as the server, so snapshot coordinates line up
+    screen = pygame.display.set_mode((map.width, map.height))
+    pygame.display.set_caption('Fuzzy Space Shooter! (spectating)')
+    assets.convert()
+    background = assets.get('maps/3.png', (map.width, map.height))
+    ship_images = [assets.get('player_ship.png', Spaceship.SIZE), assets.get('enemy_ship.png', Spaceship.SIZE)]
+    projectile_images = [assets.get('assets/blue_laser_bullet.png', Projectile.SIZE),
+                         assets.get('assets/red_laser_bullet.png', Projectile.SIZE)]
+
+    client = MatchClient(address)
+    receiver = threading.Thread(target=client.run, daemon=True)
+    receiver.start()
+    clock = pygame.time.Clock()
+    while receiver.is_alive():
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        screen.blit(background, (0, 0))
+        for image, ship in zip(ship_images, client.ships()):
+            rotated = pygame.transform.rotate(image, math.degrees(ship['angle']) - 90)
+            screen.blit(rotated, rotated.get_rect(center=ship['position']))
+        for projectile in client.projectiles():
+            rotated = pygame.transform.rotate(projectile_images[projectile['owner']], math.degrees(projectile['angle']) - 90)
+            screen.blit(rotated, rotated.get_rect(center=projectile['position']))
+        pygame.display.flip()
+        clock.tick(60)
+    client.close()
+    pygame.quit()
+
+def serve(address, tick_rate: float, snapshot_rate: float, duration: float = None, queue=None):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    server = MatchServer(address, tick_rate, snapshot_rate)
+    print(f'Match server listening on {server.address[0]}:{server.address[1]}', flush=True)
+    if queue is not None:
+        queue.put(server.address)
+    try:
+        server.run(duration)
+    finally:
+        server.close()
+    if queue is not None:
+        queue.put((server.stats(), server.match.tick, server.step_time, server.scores))
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else math.nan
+
+def bench(bots: int, spectators: int, seconds: float, tick_rate: float, snapshot_rate: float):
+    """
+    Runs a server process and loopback clients, then reports the tick rate reached and bandwidth and latency per client.
+    Ships without a bot are fuzzy-flown, use `bots < 2` to measure the simulation's cost.
+    """
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(('127.0.0.1', 0), tick_rate, snapshot_rate, seconds, queue))
+    server.start()
+    address = queue.get()
+
+    clients: list[MatchClient] = [BotClient(address, ship) for ship in range(min(bots, SHIP_COUNT))]
+    clients += [MatchClient(address) for _ in range(spectators)]
+    ports = [client.socket.getsockname()[1] for client in clients]
+    threads = [threading.Thread(target=client.run) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats, ticks, step_time, scores = queue.get(timeout=30)
+    server.join()
+
+    fuzzy_ships = SHIP_COUNT - min(bots, SHIP_COUNT)
+    print(f'{ticks} ticks in {seconds:.1f} s ({ticks / seconds:.1f}/{tick_rate:g} ticks/s, fuzzy-flown ships: {fuzzy_ships}), '
+          f'{step_time / max(1, ticks) * 1000:.2f} ms/tick simulating, scores {scores}')
+    if ticks < 0.95 * tick_rate * seconds:
+        print('The simulation can\'t keep up, the match runs slower than real time')
+    print(f'{"client":<12}{"snapshots":>10}{"kB/s":>9}{"full kB/s":>11}{"ratio":>7}'
+          f'{"latency ms (mean/p95)":>24}{"input ms (mean)":>17}')
+    stats = {server_side['address'][1]: server_side for server_side in stats}
+    for client, port in zip(clients, ports):
+        server_side = stats[port]
+        name = f'bot {client.ship}' if client.role == BOT else 'spectator'
+        inputs = server_side['input_latencies']
+        latencies = [latency * 1000 for latency in client.latencies]
+        print(f'{name:<12}{client.snapshots:>10}{client.bytes_received / seconds / 1000:>9.2f}'
+              f'{server_side["full_bytes"] / seconds / 1000:>11.2f}'
+              f'{server_side["full_bytes"] / max(1, server_side["bytes_sent"]):>7.1f}'
+              f'{sum(latencies) / max(1, len(latencies)):>15.2f} /{percentile(latencies, 0.95):>6.2f}'
+              + (f'{sum(inputs) / len(inputs) * 1000:>17.2f}' if inputs else f'{"-":>17}'))
+        client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Authoritative match server for Fuzzy Space Shooter.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--tick-rate', type=float, default=60)
+    parser.add_argument('--snapshot-rate', type=float, default=20)
+    parser.add_argument('--spectate', action='store_true', help='open a renderer client instead of serving')
+    parser.add_argument('--bench', action='store_true', help='loopback harness reporting bandwidth & latency')
+    parser.add_argument('--bots', type=int, default=2)
+    parser.add_argument('--spectators', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bots, args.spectators, args.seconds, args.tick_rate, args.snapshot_rate)
+    elif args.spectate:
+        run_renderer((args.host, args.port))
+    else:
+        serve((args.host, args.port), args.tick_rate, args.snapshot_rate)
@@ -0,0 +1,117 @@
+import math
+from time import sleep
+from typing import Sequence
+
+from asset_manager import assets
+from map import Map, RayCastResult
+from spaceship import Spaceship, ShipController
+from fuzzy_ship_controller import FuzzyShipController
+
+sensors_angles = {
+    'head': math.radians(0),
+    'left': math.radians(30),
+    'right': math.radians(-30),
+    'hard_left': math.radians(90),
+    'hard_right': math.radians(-90),
+}
+
+PLAYER = 0
+ENEMY = 1
+
+def load_map(path: str = 'maps/2.png', max_width: int = 900, max_height: int = 900) -> Map:
+    map = Map(assets.get(path), max_width, max_height)
+    map.default_wall_condition = lambda x_y, map : map.surface.get_at((int(x_y[0]), int(x_y[1])))[1] > 100 # green
+    return map
+
+class Match:
+    """
+    The simulation shared by the game (main.py) and the match server: sensors, controllers, collisions
+    and ship updates, no drawing. The display must be set before creating it (ships read its size).
+    """
+    START_OFFSETS = ((-60, 0), (90, 0))  # player, enemy; from the map's starting position
+
+    def __init__(self, map: Map, controller_types: Sequence[type] = (FuzzyShipController, FuzzyShipController),
+                 error_backoff: float = 0):
+        self.map = map
+        enemy = Spaceship('enemy_ship.png', self.start_position(ENEMY), map.starting_angle)
+        player = Spaceship('player_ship.png', self.start_position(PLAYER), map.starting_angle, enemy.position)
+        enemy.default_wall_condition = lambda x_y, spaceship: spaceship.is_near_enemy(x_y, player.position)
+        player.default_wall_condition = lambda x_y, spaceship: spaceship.is_near_enemy(x_y, enemy.position)
+        self.ships = [player, enemy]
+
+        # Keep the ships inside the map (the window may be wider, e.g. with the charts panel)
+        for ship in self.ships:
+            ship.screen_width, ship.screen_height = map.width, map.height
+
+        self.controllers: list[ShipController] = [controller_type(ship)
+                                                  for controller_type, ship in zip(controller_types, self.ships)]
+        self.sensors: dict[int, tuple[dict[str, RayCastResult], dict[str, RayCastResult]]] = {}  # last wall & ship ray casts
+        self.error_backoff = error_backoff  # s to sleep after a fuzzy simulation error, so it doesn't flood the output
+        self.tick = 0
+        self.time: float = 0  # simulated s, sum of dt
+
+    def start_position(self, index: int):
+        return tuple(a + b for a, b in zip(self.map.starting_position, Match.START_OFFSETS[index]))
+
+    @property
+    def winner(self) -> int | None:
+        player, enemy = self.ships
+        if player.health == 0:
+            return ENEMY
+        if enemy.health == 0:
+            return PLAYER
+        return None
+
+    def restart(self):
+        for i, ship in enumerate(self.ships):
+            ship.reset_position(self.start_position(i))
+            ship.angle = self.map.starting_angle
+            ship.health = ship.max_health
+
+    def sense(self):
+        """Casts the sensor rays of the ships driven by fuzzy controllers."""
+        for i, (ship, controller) in enumerate(zip(self.ships, self.controllers)):
+            if isinstance(controller, FuzzyShipController):
+                wall_ray_casts = {k: self.map.cast_ray_to_wall(ship.position, ship.angle + v)
+                                  for k, v in sensors_angles.items()}
+                ship_ray_casts = {k: ship.cast_ray_to_ship(ship.position, ship.angle + v)
+                                  for k, v in sensors_angles.items()}
+                self.sensors[i] = (wall_ray_casts, ship_ray_casts)
+            else:
+                self.sensors.pop(i, None)
+
+    def update_fuzzy_controllers(self):
+        for i, controller in enumerate(self.controllers):
+            if i not in self.sensors or not isinstance(controller, FuzzyShipController):
+                continue
+            wall_ray_casts, ship_ray_casts = self.sensors[i]
+            try:
+                controller.update_simulation(wall_sensors=wall_ray_casts, enemy_sensors=ship_ray_casts)
+            except ValueError as error:
+                print('Error updating simulation:', error)
+                try:
+                    controller.simulation.print_state()
+                except ValueError as error:
+                    print('Further error printing out state:', error)
+                    print('inputs: ' + ' '.join([f'{v.label}={v.input["current"]}, ' for v in controller.inputs]))
+                if self.error_backoff:
+                    sleep(self.error_backoff)
+
+    def step(self, dt: float):
+        self.sense()
+        self.update_fuzzy_controllers()
+
+        player, enemy = self.ships
+        player.check_collision(enemy.projectiles)
+        enemy.check_collision(player.projectiles)
+
+        player.check_screen_boundaries()
+        enemy.check_screen_boundaries()
+
+        for controller in self.controllers:
+            controller.update(dt=dt)
+        for ship in self.ships:
+            ship.update(dt=dt)
+
+        self.tick += 1
+        self.time += dt
@@ -3,6 +3,7 @@ import pygame
 import math
 from typing import Callable, Sequence
 
+from asset_manager import assets
 from map import Coordinate
 
 Coordinate_Cast = Sequence[float] 
@@ -24,41 +25,54 @@ class RayCastResult:
             pygame.draw.line(surface, color, self.start_position, self.hit_position, width)
 
 class Heart(pygame.sprite.Sprite):
+    SIZE = (30, 30)
+
     def __init__(self, image_path, position):
         super().__init__()
-        self.image = pygame.transform.scale(pygame.image.load(image_path), (30, 30))
+        self.image = assets.get(image_path, Heart.SIZE)
         self.rect = self.image.get_rect(center=position)
         
     def hit(self):
         self.kill()
         
     def draw(self, screen):
-        screen.blit(self.image, self.rect)
+        return screen.blit(self.image, self.rect)
     
 class Ammo(pygame.sprite.Sprite):
+    SIZE = (30, 30)
+
     def __init__(self, image_path, position):
         super().__init__()
-        self.image = pygame.transform.scale(pygame.image.load(image_path), (30, 30))
+        self.image = assets.get(image_path, Ammo.SIZE)
         self.rect = self.image.get_rect(center=position)
         
     def cooldown(self):
         self.kill()
         
     def draw(self, screen):
-        screen.blit(self.image, self.rect)
+        return screen.blit(self.image, self.rect)
 
 class Projectile(pygame.sprite.Sprite):
+    SIZE = (10, 5)
+
     def __init__(self, imgPath, position: Coordinate, angle: float, iniVelocity: float = 0, acceleration: float = 100):
         super().__init__()
-        self.base_image = pygame.transform.scale(pygame.image.load(imgPath), (10, 5))
+        self.base_image = assets.get(imgPath, Projectile.SIZE)
         self.rect = self.base_image.get_rect(center=position)
         self.position = list(position)
+        self.previous_position = tuple(position)  # start of the last step, for swept collision
         self.angle = angle
         self.acceleration = acceleration
         self.velocity = max(iniVelocity, 300)
         self.screen_width, self.screen_height = pygame.display.get_surface().get_size()
 
     def update(self, dt):
+        # Remove o projétil só um passo depois de sair da tela, para que o trecho em que ele saiu ainda seja testado
+        if not self.on_screen(self.previous_position) and not self.on_screen(self.position):
+            self.kill()
+            return
+
+        self.previous_position = tuple(self.position)
         self.velocity += self.acceleration * dt
         self.position[0] += self.velocity * math.sin(self.angle) * dt
         self.position[1] += self.velocity * math.cos(self.angle) * dt
@@ -66,10 +80,9 @@ class Projectile(pygame.sprite.Sprite):
         self.image = pygame.transform.rotate(self.base_image, math.degrees(self.angle) - 90)
         self.rect = self.image.get_rect(center=self.position)
         self.rect.center = self.position
-        
-        # Remove o projétil se ele sair da tela
-        if not self.rect.colliderect(pygame.Rect(0, 0, self.screen_width, self.screen_height)):
-            self.kill()  # Remove o sprite do grupo de sprites
+
+    def on_screen(self, position: Coordinate):
+        return self.rect.move_to(center=position).colliderect(pygame.Rect(0, 0, self.screen_width, self.screen_height))
 
 class Spaceship(pygame.sprite.Sprite):
     MAX_VELOCITY_FORWARD = 200
@@ -79,12 +92,14 @@ class Spaceship(pygame.sprite.Sprite):
     BRAKING_FACTOR = 50
     IDLE_DECAY_FACTOR = 5
     STEER_DECAY_FACTOR = 20
+    SIZE = (56, 56)
 
     def __init__(self, imgPath, position: Coordinate, angle: float = 0, enemy_position: Coordinate = (0, 0)):
         super().__init__()
-        self.size = (56, 56) 
-        self.base_image = pygame.transform.scale(pygame.image.load(imgPath), (self.size[0], self.size[1]))
+        self.size = Spaceship.SIZE
+        self.base_image = assets.get(imgPath, self.size)
         self.position = list(position)
+        self.previous_position = tuple(position)  # start of the last step, for swept collision
         self.velocity: float = 30
         self.angle = angle  # radians
         self.enemy_position = enemy_position
@@ -119,29 +134,45 @@ class Spaceship(pygame.sprite.Sprite):
             
     def check_collision(self, projectiles):
         for projectile in projectiles:
-            if pygame.sprite.collide_rect(self, projectile):
+            if self.swept_collide(projectile):
                 self.receive_damage()
 
+    def swept_collide(self, projectile: Projectile) -> bool:
+        """
+        Tests the projectile's whole last step instead of only where it ended, so fast projectiles
+        (or large dt) cannot tunnel through the ship. Relative to the ship, the projectile's center moves along
+        a segment, which hits if it crosses the ship's rect grown by the projectile's rect (same as rects overlapping).
+        """
+        if self.rect is None:  # not updated yet
+            return False
+        target = self.rect.inflate(projectile.rect.width, projectile.rect.height)
+        start = (projectile.previous_position[0] + self.position[0] - self.previous_position[0],
+                 projectile.previous_position[1] + self.position[1] - self.previous_position[1])
+        return bool(target.clipline(start, projectile.position))
+
+    def reset_position(self, position: Coordinate):
+        """Moves the ship outside of `update()` (restart, respawn); the jump doesn't count as a step for swept collision."""
+        self.position[0], self.position[1] = position
+        self.previous_position = tuple(self.position)
+        if self.rect is not None:
+            self.rect.center = self.position
+
     def check_screen_boundaries(self):
         if (self.position[0] < 0 + self.size[0] / 2): 
             self.receive_damage()
-            self.position[0] = self.screen_width / 2
-            self.position[1] = self.screen_height / 2
+            self.reset_position((self.screen_width / 2, self.screen_height / 2))
             self.velocity = 1
         if (self.position[0] > self.screen_width - self.size[0] / 2):
             self.receive_damage()
-            self.position[0] = self.screen_width / 2
-            self.position[1] = self.screen_height / 2
+            self.reset_position((self.screen_width / 2, self.screen_height / 2))
             self.velocity = 1
         if (self.position[1] < 0 + self.size[1] / 2):
             self.receive_damage()
-            self.position[0] = self.screen_width / 2
-            self.position[1] = self.screen_height / 2
+            self.reset_position((self.screen_width / 2, self.screen_height / 2))
             self.velocity = 1
         if (self.position[1] > self.screen_height - self.size[1] / 2): 
             self.receive_damage()
-            self.position[0] = self.screen_width / 2
-            self.position[1] = self.screen_height / 2
+            self.reset_position((self.screen_width / 2, self.screen_height / 2))
             self.velocity = 1
         
     
@@ -156,6 +187,7 @@ class Spaceship(pygame.sprite.Sprite):
     def update(self, dt: float):
         self.brake(dt * Spaceship.IDLE_DECAY_FACTOR)
 
+        self.previous_position = tuple(self.position)
         self.position[0] += self.velocity * math.sin(self.angle) * dt
         self.position[1] += self.velocity * math.cos(self.angle) * dt
 
@@ -242,6 +274,17 @@ class Spaceship(pygame.sprite.Sprite):
         return RayCastResult(position, None, angle, max_distance)  # missed
     
 
+# Every scaled sprite the game uses (path -> size), preloaded & packed by the asset manager
+SPRITES = {
+    'assets/heart.png': Heart.SIZE,
+    'assets/black_heart.png': Heart.SIZE,
+    'assets/charge.png': Ammo.SIZE,
+    'assets/blue_laser_bullet.png': Projectile.SIZE,
+    'assets/red_laser_bullet.png': Projectile.SIZE,
+    'player_ship.png': Spaceship.SIZE,
+    'enemy_ship.png': Spaceship.SIZE,
+}
+
 class ShipController():
     def __init__(self, ship: Spaceship):
         self.ship = ship
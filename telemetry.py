@@ -0,0 +1,215 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Sequence
+import numpy as np
+
+from map import RayCastResult
+from spaceship import Spaceship, ShipController
+
+SENSORS = ('head', 'left', 'right', 'hard_left', 'hard_right')
+FUZZY_INPUTS = ('velocity', 'w_balance', 'w_side', 'w_head', 'e_balance', 'e_side', 'e_head')
+FUZZY_OUTPUTS = ('gas', 'brake', 'steer')
+
+# One row per ship per tick; sensors and fuzzy inputs are NaN when not available for the ship
+TELEMETRY_DTYPE = np.dtype([
+    ('tick', 'u4'),
+    ('time', 'f8'),  # simulated s since the start of the run (sum of dt)
+    ('ship', 'u1'),
+    ('x', 'f4'),
+    ('y', 'f4'),
+    ('angle', 'f4'),  # radians
+    ('velocity', 'f4'),
+    ('health', 'u1'),
+    ('wall_sensors', 'f4', (len(SENSORS),)),
+    ('enemy_sensors', 'f4', (len(SENSORS),)),
+    ('fuzzy_inputs', 'f4', (len(FUZZY_INPUTS),)),
+    ('outputs', 'f4', (len(FUZZY_OUTPUTS),)),
+    ('projectiles', 'u2'),
+])
+
+def column_names(dtype: np.dtype = TELEMETRY_DTYPE) -> list[str]:
+    """Flat column names, subarray fields are expanded as field_item."""
+    items = {'wall_sensors': SENSORS, 'enemy_sensors': SENSORS, 'fuzzy_inputs': FUZZY_INPUTS, 'outputs': FUZZY_OUTPUTS}
+    names = []
+    for name in dtype.names:
+        if dtype[name].shape:
+            names += [f'{name}_{item}' for item in items[name]]
+        else:
+            names.append(name)
+    return names
+
+class TelemetryRing:
+    """
+    Preallocated ring buffer of TELEMETRY_DTYPE rows, filled in place by the game loop.
+    `written` only ever grows, the row for it lives at `written % capacity`.
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self.written = 0
+
+    def record(self, tick: int, t: float, ship_index: int, ship: Spaceship, controller: ShipController,
+               wall_sensors: dict[str, RayCastResult] = None, enemy_sensors: dict[str, RayCastResult] = None):
+        row = self.data[self.written % self.capacity]  # structured scalar, a view into self.data
+        row['tick'] = tick
+        row['time'] = t
+        row['ship'] = ship_index
+        row['x'], row['y'] = ship.position
+        row['angle'] = ship.angle
+        row['velocity'] = ship.velocity
+        row['health'] = ship.health
+        row['wall_sensors'] = [wall_sensors[k].distance for k in SENSORS] if wall_sensors else np.nan
+        row['enemy_sensors'] = [enemy_sensors[k].distance for k in SENSORS] if enemy_sensors else np.nan
+        inputs = getattr(controller, 'last_inputs', None)
+        row['fuzzy_inputs'] = [inputs.get(k, np.nan) for k in FUZZY_INPUTS] if inputs else np.nan
+        row['outputs'] = (controller.gas, controller.brake, controller.steer)
+        row['projectiles'] = len(ship.projectiles)
+        self.written += 1
+
+    def views(self, start: int, stop: int) -> list[np.ndarray]:
+        """Rows [start, stop) as up to two contiguous views, oldest first. Only valid while not overwritten."""
+        start = max(start, stop - self.capacity)
+        if start >= stop:
+            return []
+        i, j = start % self.capacity, stop % self.capacity
+        if i < j:
+            return [self.data[i:j]]
+        return [view for view in (self.data[i:], self.data[:j]) if len(view)]
+
+    def recent(self, n: int) -> list[np.ndarray]:
+        """Last n rows without copying, see `views()`."""
+        return self.views(self.written - n, self.written)
+
+class CsvSink:
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='')
+        self.file.write(','.join(column_names()) + '\n')
+
+    def write(self, rows: np.ndarray):
+        columns = [rows[name].reshape(len(rows), -1) for name in rows.dtype.names]
+        np.savetxt(self.file, np.hstack(columns), delimiter=',', fmt='%.10g')
+
+    def close(self):
+        self.file.close()
+
+class ColumnarSink:
+    """
+    One raw little-endian file per column in `directory` plus a schema.json,
+    so single columns can be read (or memory mapped) with `load_columns()` without touching the others.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.files = {name: open(os.path.join(directory, f'{name}.bin'), 'wb') for name in TELEMETRY_DTYPE.names}
+        schema = {name: {'dtype': TELEMETRY_DTYPE[name].base.newbyteorder('<').str, 'shape': TELEMETRY_DTYPE[name].shape}
+                  for name in TELEMETRY_DTYPE.names}
+        with open(os.path.join(directory, 'schema.json'), 'w') as file:
+            json.dump(schema, file, indent=2)
+
+    def write(self, rows: np.ndarray):
+        for name, file in self.files.items():
+            file.write(rows[name].astype(rows.dtype[name].base.newbyteorder('<'), copy=False).tobytes())
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+def load_columns(directory: str, names: Sequence[str] = None, mmap: bool = True) -> dict[str, np.ndarray]:
+    with open(os.path.join(directory, 'schema.json')) as file:
+        schema = json.load(file)
+    columns = {}
+    for name in names or schema:
+        dtype, shape = np.dtype(schema[name]['dtype']), tuple(schema[name]['shape'])
+        path = os.path.join(directory, f'{name}.bin')
+        if mmap and os.path.getsize(path) > 0:
+            column = np.memmap(path, dtype=dtype, mode='r')
+        else:
+            column = np.fromfile(path, dtype=dtype)
+        columns[name] = column.reshape((-1,) + shape)
+    return columns
+
+class SocketSink:
+    """Streams the raw TELEMETRY_DTYPE records to a local socket (TCP `host:port` or a unix socket path)."""
+
+    def __init__(self, address: str):
+        if ':' in address:
+            host, port = address.rsplit(':', 1)
+            self.socket = socket.create_connection((host, int(port)))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+
+    def write(self, rows: np.ndarray):
+        self.socket.sendall(rows.view(np.uint8))
+
+    def close(self):
+        self.socket.close()
+
+def open_sink(spec: str):
+    """`csv:<path>`, `columns:<directory>` or `socket:<host:port|path>`"""
+    kind, _, target = spec.partition(':')
+    if kind == 'csv':
+        return CsvSink(target)
+    if kind == 'columns':
+        return ColumnarSink(target)
+    if kind == 'socket':
+        return SocketSink(target)
+    raise ValueError(f'Unknown telemetry sink: {spec}')
+
+class TelemetryWriter:
+    """
+    Background thread draining the ring into a sink in bulk chunks.
+    The game loop never waits on it: if the writer falls more than `capacity` rows behind,
+    the overwritten rows are skipped and counted in `dropped`.
+    """
+
+    def __init__(self, ring: TelemetryRing, sink, interval: float = 0.25, chunk_size: int = 4096):
+        self.ring = ring
+        self.sink = sink
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.read = 0
+        self.dropped = 0
+        self.running = False
+        self.thread: threading.Thread | None = None
+
+    def drain(self):
+        while self.read < self.ring.written:
+            stop = min(self.ring.written, self.read + self.chunk_size)
+            start = max(self.read, stop - self.ring.capacity)
+            self.dropped += start - self.read
+            # Copy out first, then check the producer did not lap us while copying;
+            # the row being filled right now (at `written`) overwrites row `written - capacity` too
+            chunk = np.concatenate(self.ring.views(start, stop))
+            lapped = min(len(chunk), self.ring.written + 1 - self.ring.capacity - start)
+            if lapped > 0:
+                self.dropped += lapped
+                chunk = chunk[lapped:]
+            if len(chunk):
+                self.sink.write(chunk)
+            self.read = stop
+
+    def run(self):
+        while self.running:
+            start = time.perf_counter()
+            self.drain()
+            time.sleep(max(0, self.interval - (time.perf_counter() - start)))
+        self.drain()
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name='telemetry', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.sink.close()
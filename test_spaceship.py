@@ -0,0 +1,41 @@
+import math
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+
+pygame.init()
+
+from simulation import Match, load_map
+from spaceship import Projectile
+
+map = load_map()
+pygame.display.set_mode((map.width, map.height))
+match = Match(map)
+
+def test_restart_with_projectiles_in_flight_does_no_damage():
+    player, enemy = match.ships
+    match.restart()
+    player.reset_position((100, 300))
+    player.update(dt=1 / 60)
+    projectile = Projectile('assets/red_laser_bullet.png', (50, 300), -math.pi / 2)  # flying away from the player
+    projectile.update(dt=1 / 60)
+    enemy.projectiles.add(projectile)
+    assert not player.rect.colliderect(projectile.rect)
+
+    match.restart()
+    player.check_collision(enemy.projectiles)
+    assert player.health == player.max_health
+
+def test_swept_collision_still_hits_after_restart():
+    player, enemy = match.ships
+    match.restart()
+    enemy.projectiles.empty()
+    player.update(dt=1 / 60)
+    x, y = player.position
+    projectile = Projectile('assets/red_laser_bullet.png', (x - 200, y), math.pi / 2)  # through the player in one step
+    projectile.update(dt=1)
+    enemy.projectiles.add(projectile)
+
+    player.check_collision(enemy.projectiles)
+    assert player.health == player.max_health - 1